@@ -4,37 +4,224 @@ Run with:
     shiny run app.py
 """
 
+import hashlib
+import inspect
 import pathlib
 
+import numba
 import numpy as np
 import pandas as pd
+from joblib import Memory
 from shiny import App, reactive, render, ui
 
+try:
+    import polars as pl
+except ImportError:  # optional: only speeds up the Data Table preview
+    pl = None
+
 # ---------------------------------------------------------------------------
 # Data loading
 # ---------------------------------------------------------------------------
 
-DATA_PATH = pathlib.Path(__file__).parent / "data" / "transactions.csv"
+DATA_PATH = pathlib.Path(__file__).parent / "data" / "transactions.parquet"
+# The original LFS-tracked CSV, used when the Parquet file has not been generated.
+CSV_PATH = DATA_PATH.with_suffix(".csv")
+CATEGORICAL_COLUMNS = ["category", "region", "status", "payment_method", "city"]
+
+# On-disk cache for aggregates that only depend on the dataset itself.
+MEMORY = Memory(pathlib.Path(__file__).parent / ".cache", verbose=0)
+
+# Cell formatters handed to ``DataFrame.to_html`` by the summary tables, so
+# numbers are formatted while the HTML is written rather than in a separate pass.
+MONEY = "${:,.2f}".format
+PERCENT = "{:.1f}%".format
+
+# Decimal places of the float32 money columns when shown in the data grid.
+DISPLAY_DECIMALS = {"unit_price": 2, "subtotal": 2, "tax_rate": 4, "tax": 2, "total": 2}
+
+
+def find_data_path() -> pathlib.Path:
+    """Return the Parquet dataset if it exists, else the LFS-tracked CSV."""
+    for path in (DATA_PATH, CSV_PATH):
+        if path.exists():
+            return path
+    raise FileNotFoundError(
+        f"Neither {DATA_PATH} nor {CSV_PATH} found. Run `python generate_dataset.py` first."
+    )
+
+
+def load_data(path: pathlib.Path) -> pd.DataFrame:
+    """Load the transactions Parquet (or fallback CSV) file into a DataFrame."""
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path, engine="pyarrow")
+    else:
+        # Match the Parquet dtypes so the code-based filters and kernels work.
+        df = pd.read_csv(
+            path,
+            parse_dates=["timestamp"],
+            dtype={col: "category" for col in CATEGORICAL_COLUMNS},
+        )
+    # Time order lets the date filter be a binary search instead of a scan.
+    df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    # Keep the day as datetime64 rather than Python ``date`` objects so filters
+    # and groupbys run on native int64 values.
+    df["date"] = df["timestamp"].dt.floor("D")
+    return df
 
 
-def load_data() -> pd.DataFrame:
-    """Load the transactions CSV into a DataFrame."""
-    if not DATA_PATH.exists():
-        raise FileNotFoundError(
-            f"{DATA_PATH} not found. Run `python generate_dataset.py` first."
+SOURCE_PATH = find_data_path()
+DF = load_data(SOURCE_PATH)
+
+# Measured once; the sidebar scales these instead of re-walking the data.
+BYTES_PER_ROW = DF.memory_usage(deep=True).sum() / max(len(DF), 1)
+DATA_SIZE_MB = SOURCE_PATH.stat().st_size / (1024**2)
+DATA_FORMAT = "Parquet" if SOURCE_PATH.suffix == ".parquet" else "CSV"
+
+MIN_DATE = DF["date"].min().date()
+MAX_DATE = DF["date"].max().date()
+
+# Integer category codes for the categorical columns.
+CAT_CODES = DF["category"].cat.codes.to_numpy()
+REG_CODES = DF["region"].cat.codes.to_numpy()
+STATUS_CODES = DF["status"].cat.codes.to_numpy()
+PAY_CODES = DF["payment_method"].cat.codes.to_numpy()
+
+
+def build_bitmaps(col: str) -> dict[str, np.ndarray]:
+    """Return a packed row bitmap for every category of *col*."""
+    codes = DF[col].cat.codes.to_numpy()
+    return {name: np.packbits(codes == i) for i, name in enumerate(DF[col].cat.categories)}
+
+
+# Packed per-value bitmaps for the filter columns; a selection is the OR of
+# its values' bitmaps, which avoids a per-row membership test on every change.
+CAT_BITMAPS = build_bitmaps("category")
+REG_BITMAPS = build_bitmaps("region")
+STATUS_BITMAPS = build_bitmaps("status")
+
+# Filter choices are the observed values; only these few names get sorted.
+ALL_CATEGORIES = sorted(name for name, bits in CAT_BITMAPS.items() if bits.any())
+ALL_REGIONS = sorted(name for name, bits in REG_BITMAPS.items() if bits.any())
+ALL_STATUSES = sorted(name for name, bits in STATUS_BITMAPS.items() if bits.any())
+
+DATES = DF["date"].to_numpy()
+
+# Customer ids are a dense integer range, so distinct counts can use a flag array.
+CUSTOMER_MIN = int(DF["customer_id"].min())
+CUSTOMER_SPAN = int(DF["customer_id"].max()) - CUSTOMER_MIN + 1
+
+# Dense day numbers (days since the first date) so dates can be bucketed the
+# same way as the categorical columns.
+DATE_CODES = (DATES - np.datetime64(MIN_DATE, "D")).astype("timedelta64[D]").astype(np.int32)
+DATE_LABELS = np.arange(np.datetime64(MIN_DATE, "D"), np.datetime64(MAX_DATE, "D") + 1)
+
+
+@numba.njit(parallel=True, cache=True)
+def _bucket_sum_count(codes, values, n_groups, n_chunks):
+    n = len(codes)
+    chunk = (n + n_chunks - 1) // n_chunks
+    # Each thread fills its own row of partial results to avoid write races.
+    part_sums = np.zeros((n_chunks, n_groups))
+    part_counts = np.zeros((n_chunks, n_groups), np.int64)
+    for t in numba.prange(n_chunks):
+        for i in range(t * chunk, min(n, (t + 1) * chunk)):
+            k = codes[i]
+            part_sums[t, k] += values[i]
+            part_counts[t, k] += 1
+    sums = np.zeros(n_groups)
+    counts = np.zeros(n_groups, np.int64)
+    for t in range(n_chunks):
+        sums += part_sums[t]
+        counts += part_counts[t]
+    return sums, counts
+
+
+def bucket_sum_count(codes: np.ndarray, values: np.ndarray, n_groups: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return per-group sums of *values* and row counts for dense integer *codes*."""
+    return _bucket_sum_count(codes, values, n_groups, numba.get_num_threads())
+
+
+def group_totals(codes: np.ndarray, values: np.ndarray, labels, name: str) -> pd.DataFrame:
+    """Return transactions and revenue per label, skipping labels with no rows."""
+    sums, counts = bucket_sum_count(codes, values, len(labels))
+    keep = counts > 0
+    # The kernel output is already clean, typed column arrays, so skip the
+    # dict-of-arrays inference and consolidation of the public constructor.
+    return pd.DataFrame._from_arrays(
+        [counts[keep], sums[keep]],
+        columns=["transactions", "revenue"],
+        index=pd.Index(labels, name=name)[keep],
+        verify_integrity=False,
+    )
+
+
+def preview_rows(idx: np.ndarray):
+    """Return the rows at *idx* for the data grid, formatted for display."""
+    # Widen the float32 money columns so the grid shows 26.11, not 26.110000610351562,
+    # and show the day column as a plain date rather than a midnight timestamp.
+    if pl is not None:
+        # Convert only the previewed slice; a full Polars copy would double memory.
+        return pl.from_pandas(DF.take(idx)).with_columns(
+            *(pl.col(col).cast(pl.Float64).round(decimals) for col, decimals in DISPLAY_DECIMALS.items()),
+            pl.col("date").cast(pl.Date),
         )
-    df = pd.read_csv(DATA_PATH, parse_dates=["timestamp"])
-    df["date"] = df["timestamp"].dt.date
-    return df
+    preview = DF.take(idx).astype({col: np.float64 for col in DISPLAY_DECIMALS}).round(DISPLAY_DECIMALS)
+    preview["date"] = preview["date"].dt.date
+    return preview
+
+
+def bitmap_union(bitmaps: dict[str, np.ndarray], selected) -> np.ndarray:
+    """Return the packed bitmap of rows matching any of the *selected* names."""
+    packed = np.zeros((len(DF) + 7) // 8, dtype=np.uint8)
+    for name in selected:
+        packed |= bitmaps[name]
+    return packed
+
+
+def summarise(idx: np.ndarray) -> dict[str, pd.DataFrame]:
+    """Return the per-key summary frames used by the tables for the rows at *idx*."""
+    totals = DF["total"].values.take(idx)
+
+    cat_codes = CAT_CODES.take(idx)
+    category = group_totals(cat_codes, totals, DF["category"].cat.categories, "category")
+    price_sums, price_counts = bucket_sum_count(cat_codes, DF["unit_price"].values.take(idx), len(CAT_BITMAPS))
+    category["avg_price"] = (price_sums / np.maximum(price_counts, 1))[price_counts > 0]
+
+    region = group_totals(REG_CODES.take(idx), totals, DF["region"].cat.categories, "region")
+    region["avg_order"] = region["revenue"] / region["transactions"]
+
+    status = group_totals(STATUS_CODES.take(idx), totals, DF["status"].cat.categories, "status")
+    return {
+        "daily": group_totals(DATE_CODES.take(idx), totals, DATE_LABELS, "date"),
+        "category": category,
+        "region": region,
+        "payment": group_totals(
+            PAY_CODES.take(idx), totals, DF["payment_method"].cat.categories, "payment_method"
+        ),
+        "status": status.rename(columns={"transactions": "count"}),
+    }
+
 
+@MEMORY.cache
+def full_aggregates(data_key: tuple, code_key: str) -> dict[str, pd.DataFrame]:
+    """Return ``summarise`` over every row, cached on disk per dataset and code version."""
+    return summarise(np.arange(len(DF)))
 
-DF = load_data()
 
-ALL_CATEGORIES = sorted(DF["category"].unique().tolist())
-ALL_REGIONS = sorted(DF["region"].unique().tolist())
-ALL_STATUSES = sorted(DF["status"].unique().tolist())
-MIN_DATE = DF["date"].min()
-MAX_DATE = DF["date"].max()
+def summary_code_key() -> str:
+    """Return a hash of the aggregation code, so editing it invalidates the disk cache."""
+    funcs = [_bucket_sum_count.py_func, bucket_sum_count, group_totals, summarise]
+    source = "".join(inspect.getsource(f) for f in funcs)
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+# The unfiltered view is the default, so load its tables from the disk cache.
+_stat = SOURCE_PATH.stat()
+FULL_AGGREGATES = full_aggregates(
+    (str(SOURCE_PATH.resolve()), _stat.st_size, _stat.st_mtime_ns),
+    summary_code_key(),
+)
+
 
 # ---------------------------------------------------------------------------
 # UI
@@ -152,88 +339,104 @@ app_ui = ui.page_sidebar(
 
 
 def server(input, output, session):
+    # Each input feeds its own calc so that changing one filter only recomputes
+    # that filter's piece of the mask.
+
+    @reactive.calc
+    def selected_categories() -> np.ndarray:
+        return bitmap_union(CAT_BITMAPS, input.categories())
+
+    @reactive.calc
+    def selected_regions() -> np.ndarray:
+        return bitmap_union(REG_BITMAPS, input.regions())
+
     @reactive.calc
-    def filtered_df() -> pd.DataFrame:
-        """Return the subset of data matching the current filter selections."""
+    def selected_statuses() -> np.ndarray:
+        return bitmap_union(STATUS_BITMAPS, input.statuses())
+
+    @reactive.calc
+    def value_mask() -> np.ndarray:
+        """Return the unpacked row mask for the category/region/status selections."""
+        packed = selected_categories() & selected_regions() & selected_statuses()
+        return np.unpackbits(packed, count=len(DF)).view(bool)
+
+    @reactive.calc
+    def date_slice() -> slice:
+        """Return the contiguous block of (date-sorted) rows inside the date range."""
         start, end = input.date_range()
-        mask = (
-            (DF["date"] >= start)
-            & (DF["date"] <= end)
-            & (DF["category"].isin(input.categories()))
-            & (DF["region"].isin(input.regions()))
-            & (DF["status"].isin(input.statuses()))
-        )
-        return DF.loc[mask]
+        lo = np.searchsorted(DATES, np.datetime64(start, "D"), side="left")
+        hi = np.searchsorted(DATES, np.datetime64(end, "D"), side="right")
+        return slice(lo, hi)
+
+    @reactive.calc
+    def filtered_idx() -> np.ndarray:
+        """Return the row positions in ``DF`` matching the current filter selections."""
+        rows = date_slice()
+        return rows.start + np.flatnonzero(value_mask()[rows])
 
     # -- Value boxes -------------------------------------------------------
 
     @render.text
     def n_transactions():
-        return f"{len(filtered_df()):,}"
+        return f"{len(filtered_idx()):,}"
 
     @render.text
     def total_revenue():
-        return f"${filtered_df()['total'].sum():,.2f}"
+        return f"${DF['total'].values.take(filtered_idx()).sum(dtype=np.float64):,.2f}"
 
     @render.text
     def avg_order():
-        df = filtered_df()
-        avg = df["total"].mean() if len(df) > 0 else 0
+        totals = DF["total"].values.take(filtered_idx())
+        avg = totals.mean(dtype=np.float64) if len(totals) > 0 else 0
         return f"${avg:,.2f}"
 
     @render.text
     def n_customers():
-        return f"{filtered_df()['customer_id'].nunique():,}"
+        ids = DF["customer_id"].values.take(filtered_idx())
+        present = np.zeros(CUSTOMER_SPAN, dtype=np.bool_)
+        present[ids - CUSTOMER_MIN] = True
+        return f"{np.count_nonzero(present):,}"
 
     # -- Sidebar info ------------------------------------------------------
 
     @render.ui
     def dataset_info():
-        df = filtered_df()
-        mem = df.memory_usage(deep=True).sum() / (1024 * 1024)
+        n_rows = len(filtered_idx())
+        mem = n_rows * BYTES_PER_ROW / (1024 * 1024)
         return ui.tags.ul(
             ui.tags.li(f"Full dataset: {len(DF):,} rows"),
-            ui.tags.li(f"Filtered: {len(df):,} rows"),
-            ui.tags.li(f"Columns: {len(df.columns)}"),
+            ui.tags.li(f"Filtered: {n_rows:,} rows"),
+            ui.tags.li(f"Columns: {len(DF.columns)}"),
             ui.tags.li(f"Memory: {mem:.1f} MB"),
-            ui.tags.li(f"CSV size: {DATA_PATH.stat().st_size / (1024**2):.1f} MB"),
+            ui.tags.li(f"{DATA_FORMAT} size: {DATA_SIZE_MB:.1f} MB"),
         )
 
+    @reactive.calc
+    def aggregates() -> dict[str, pd.DataFrame]:
+        """Group the filtered data once per key and share the results between tables."""
+        idx = filtered_idx()
+        if len(idx) == len(DF):
+            return FULL_AGGREGATES
+        return summarise(idx)
+
     # -- Overview tab tables -----------------------------------------------
 
-    @render.table
+    @render.table(formatters={"Revenue": MONEY})
     def daily_revenue_table():
-        df = filtered_df()
-        if df.empty:
+        daily = aggregates()["daily"]
+        if daily.empty:
             return pd.DataFrame()
-        daily = (
-            df.groupby("date")
-            .agg(transactions=("transaction_id", "count"), revenue=("total", "sum"))
-            .reset_index()
-            .sort_values("date", ascending=False)
-            .head(20)
-        )
-        daily["revenue"] = daily["revenue"].map("${:,.2f}".format)
+        # Day buckets are already in date order, so the latest days are the tail.
+        daily = daily.tail(20).iloc[::-1].reset_index()
         daily.columns = ["Date", "Transactions", "Revenue"]
         return daily
 
-    @render.table
+    @render.table(formatters={"Revenue": MONEY, "Avg Unit Price": MONEY})
     def category_summary_table():
-        df = filtered_df()
-        if df.empty:
+        cat = aggregates()["category"]
+        if cat.empty:
             return pd.DataFrame()
-        cat = (
-            df.groupby("category")
-            .agg(
-                transactions=("transaction_id", "count"),
-                revenue=("total", "sum"),
-                avg_price=("unit_price", "mean"),
-            )
-            .reset_index()
-            .sort_values("revenue", ascending=False)
-        )
-        cat["revenue"] = cat["revenue"].map("${:,.2f}".format)
-        cat["avg_price"] = cat["avg_price"].map("${:,.2f}".format)
+        cat = cat.reset_index().sort_values("revenue", ascending=False)
         cat.columns = ["Category", "Transactions", "Revenue", "Avg Unit Price"]
         return cat
 
@@ -242,78 +445,48 @@ def server(input, output, session):
     @render.data_frame
     def transactions_grid():
         return render.DataGrid(
-            filtered_df().head(input.table_rows()),
+            preview_rows(filtered_idx()[: input.table_rows()]),
             filters=True,
             height="600px",
         )
 
     # -- Statistics tab tables ---------------------------------------------
 
-    @render.table
+    @render.table(formatters={"Revenue": MONEY, "Avg Order": MONEY})
     def region_table():
-        df = filtered_df()
-        if df.empty:
+        reg = aggregates()["region"]
+        if reg.empty:
             return pd.DataFrame()
-        reg = (
-            df.groupby("region")
-            .agg(
-                transactions=("transaction_id", "count"),
-                revenue=("total", "sum"),
-                avg_order=("total", "mean"),
-            )
-            .reset_index()
-            .sort_values("revenue", ascending=False)
-        )
-        reg["revenue"] = reg["revenue"].map("${:,.2f}".format)
-        reg["avg_order"] = reg["avg_order"].map("${:,.2f}".format)
+        reg = reg.reset_index().sort_values("revenue", ascending=False)
         reg.columns = ["Region", "Transactions", "Revenue", "Avg Order"]
         return reg
 
-    @render.table
+    @render.table(formatters={"Revenue": MONEY})
     def payment_table():
-        df = filtered_df()
-        if df.empty:
+        pay = aggregates()["payment"]
+        if pay.empty:
             return pd.DataFrame()
-        pay = (
-            df.groupby("payment_method")
-            .agg(transactions=("transaction_id", "count"), revenue=("total", "sum"))
-            .reset_index()
-            .sort_values("revenue", ascending=False)
-        )
-        pay["revenue"] = pay["revenue"].map("${:,.2f}".format)
+        pay = pay.reset_index().sort_values("revenue", ascending=False)
         pay.columns = ["Payment Method", "Transactions", "Revenue"]
         return pay
 
-    @render.table
+    @render.table(formatters={"Revenue": MONEY})
     def top_days_table():
-        df = filtered_df()
-        if df.empty:
+        top = aggregates()["daily"]
+        if top.empty:
             return pd.DataFrame()
-        top = (
-            df.groupby("date")
-            .agg(transactions=("transaction_id", "count"), revenue=("total", "sum"))
-            .reset_index()
-            .sort_values("revenue", ascending=False)
-            .head(10)
-        )
-        top["revenue"] = top["revenue"].map("${:,.2f}".format)
+        top = top.nlargest(10, "revenue").reset_index()
         top.columns = ["Date", "Transactions", "Revenue"]
         return top
 
-    @render.table
+    @render.table(formatters={"Revenue": MONEY, "% of Total": PERCENT})
     def status_table():
-        df = filtered_df()
-        if df.empty:
+        st = aggregates()["status"]
+        if st.empty:
             return pd.DataFrame()
-        st = (
-            df.groupby("status")
-            .agg(count=("transaction_id", "count"), revenue=("total", "sum"))
-            .reset_index()
-            .sort_values("count", ascending=False)
-        )
+        st = st.reset_index().sort_values("count", ascending=False)
         total = st["count"].sum()
-        st["pct"] = (st["count"] / total * 100).map("{:.1f}%".format)
-        st["revenue"] = st["revenue"].map("${:,.2f}".format)
+        st["pct"] = st["count"] / total * 100
         st.columns = ["Status", "Count", "Revenue", "% of Total"]
         return st
 
@@ -1,20 +1,26 @@
 #!/usr/bin/env python3
 """Generate a large synthetic e-commerce transactions dataset for Git LFS testing.
 
-Produces a CSV with ~1.5 million rows and multiple column types (numeric,
-categorical, datetime, text).  The resulting file is typically 200-350 MB.
+Produces a Parquet file with ~1.5 million rows and multiple column types
+(numeric, categorical, datetime, text).  Low-cardinality string columns are
+stored as categoricals so they round-trip as dictionary-encoded columns.
 
 Usage:
-    python generate_dataset.py [--rows N] [--output PATH]
+    python generate_dataset.py [--rows N] [--output PATH] [--jobs N]
 """
 
 import argparse
 import os
 import pathlib
 import time
+from typing import Union
 
+import numba
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from joblib import Parallel, delayed
 
 # ---------------------------------------------------------------------------
 # Constants
@@ -62,8 +68,37 @@ CITIES = [
     "Milwaukee", "Albuquerque", "Tucson", "Fresno", "Sacramento",
 ]
 
-
-def generate_dataset(num_rows: int, seed: int = 42) -> pd.DataFrame:
+# Rows generated per parallel work unit (and per independent random stream).
+CHUNK_ROWS = 250_000
+
+
+@numba.njit(parallel=True, cache=True)
+def compute_totals(unit_prices, quantities, discounts, tax_rates):
+    """Return rounded (subtotals, taxes, totals) in a single pass over the rows."""
+    n = len(unit_prices)
+    subtotals = np.empty(n)
+    taxes = np.empty(n)
+    totals = np.empty(n)
+    for i in numba.prange(n):
+        # Same rounding as np.round(x, 2): scale, round half to even, unscale.
+        sub = np.rint(unit_prices[i] * quantities[i] * (1 - discounts[i]) * 100.0) / 100.0
+        tax = np.rint(sub * tax_rates[i] * 100.0) / 100.0
+        subtotals[i] = sub
+        taxes[i] = tax
+        totals[i] = np.rint((sub + tax) * 100.0) / 100.0
+    return subtotals, taxes, totals
+
+
+def random_categorical(rng: np.random.Generator, values: list[str], size: int, p=None) -> pd.Categorical:
+    """Return a categorical of *size* random draws from *values*, built from integer codes."""
+    if p is None:
+        codes = rng.integers(0, len(values), size=size, dtype=np.int8)
+    else:
+        codes = rng.choice(len(values), size=size, p=p).astype(np.int8)
+    return pd.Categorical.from_codes(codes, categories=values)
+
+
+def generate_dataset(num_rows: int, seed: Union[int, np.random.SeedSequence] = 42) -> pd.DataFrame:
     """Return a DataFrame with *num_rows* synthetic transaction records."""
 
     rng = np.random.default_rng(seed)
@@ -79,10 +114,13 @@ def generate_dataset(num_rows: int, seed: int = 42) -> pd.DataFrame:
     unit_prices = np.round(rng.exponential(scale=50, size=num_rows) + 0.99, 2)
     quantities = rng.integers(1, 21, size=num_rows)
     discounts = np.round(rng.choice([0, 0, 0, 0.05, 0.1, 0.15, 0.2, 0.25], size=num_rows), 2)
-    subtotals = np.round(unit_prices * quantities * (1 - discounts), 2)
     tax_rates = rng.choice([0.0, 0.05, 0.06, 0.07, 0.075, 0.08, 0.0825, 0.1], size=num_rows)
-    taxes = np.round(subtotals * tax_rates, 2)
-    totals = np.round(subtotals + taxes, 2)
+    subtotals, taxes, totals = compute_totals(unit_prices, quantities, discounts, tax_rates)
+
+    # Two-decimal currency fits comfortably in float32, halving these columns.
+    unit_prices, subtotals, tax_rates, taxes, totals = (
+        a.astype(np.float32) for a in (unit_prices, subtotals, tax_rates, taxes, totals)
+    )
 
     # Build DataFrame
     df = pd.DataFrame(
@@ -90,7 +128,7 @@ def generate_dataset(num_rows: int, seed: int = 42) -> pd.DataFrame:
             "transaction_id": np.arange(1, num_rows + 1),
             "timestamp": dates,
             "customer_id": rng.integers(10000, 99999, size=num_rows),
-            "category": rng.choice(CATEGORIES, size=num_rows),
+            "category": random_categorical(rng, CATEGORIES, num_rows),
             "product_id": rng.integers(100000, 999999, size=num_rows),
             "unit_price": unit_prices,
             "quantity": quantities,
@@ -99,10 +137,10 @@ def generate_dataset(num_rows: int, seed: int = 42) -> pd.DataFrame:
             "tax_rate": tax_rates,
             "tax": taxes,
             "total": totals,
-            "payment_method": rng.choice(PAYMENT_METHODS, size=num_rows),
-            "region": rng.choice(REGIONS, size=num_rows),
-            "city": rng.choice(CITIES, size=num_rows),
-            "status": rng.choice(STATUSES, size=num_rows, p=[0.60, 0.10, 0.12, 0.08, 0.06, 0.04]),
+            "payment_method": random_categorical(rng, PAYMENT_METHODS, num_rows),
+            "region": random_categorical(rng, REGIONS, num_rows),
+            "city": random_categorical(rng, CITIES, num_rows),
+            "status": random_categorical(rng, STATUSES, num_rows, p=[0.60, 0.10, 0.12, 0.08, 0.06, 0.04]),
             "is_member": rng.choice([True, False], size=num_rows, p=[0.35, 0.65]),
             "rating": rng.choice([np.nan, 1, 2, 3, 4, 5], size=num_rows, p=[0.3, 0.03, 0.07, 0.15, 0.25, 0.20]),
         }
@@ -111,24 +149,41 @@ def generate_dataset(num_rows: int, seed: int = 42) -> pd.DataFrame:
     return df
 
 
+def generate_dataset_parallel(num_rows: int, n_jobs: int = -1, seed: int = 42) -> pd.DataFrame:
+    """Generate *num_rows* records in fixed-size row chunks across *n_jobs* worker processes."""
+    # Chunk layout and seeds depend only on num_rows and seed, never on the
+    # worker count, so the output is the same on every machine.
+    n_chunks = max(1, -(-num_rows // CHUNK_ROWS))
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    sizes = [min(CHUNK_ROWS, num_rows - i * CHUNK_ROWS) for i in range(n_chunks)]
+    parts = Parallel(n_jobs=n_jobs)(
+        delayed(generate_dataset)(size, seed=child) for size, child in zip(sizes, seeds)
+    )
+    df = pd.concat(parts, ignore_index=True)
+    df["transaction_id"] = np.arange(1, len(df) + 1)
+    return df
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate a large test dataset.")
     parser.add_argument("--rows", type=int, default=1_500_000, help="Number of rows (default: 1,500,000)")
-    parser.add_argument("--output", type=str, default="data/transactions.csv", help="Output CSV path")
+    parser.add_argument("--output", type=str, default="data/transactions.parquet", help="Output Parquet path")
+    parser.add_argument("--jobs", type=int, default=-1, help="Worker processes (default: all cores)")
     args = parser.parse_args()
 
-    out_path = pathlib.Path(args.output)
+    out_path = pathlib.Path(args.output).with_suffix(".parquet")
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
     print(f"Generating {args.rows:,} rows …")
     t0 = time.perf_counter()
-    df = generate_dataset(args.rows)
+    df = generate_dataset_parallel(args.rows, n_jobs=args.jobs)
     elapsed_gen = time.perf_counter() - t0
     print(f"  Generated in {elapsed_gen:.1f}s")
 
     print(f"Writing to {out_path} …")
     t1 = time.perf_counter()
-    df.to_csv(out_path, index=False)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, str(out_path), compression="zstd", use_dictionary=True)
     elapsed_write = time.perf_counter() - t1
     print(f"  Written in {elapsed_write:.1f}s")
 